@@ -15,20 +15,20 @@ def test_topic1(data: TopicData, payload: bytes):
         "topic1: %s, hotword: %s, payload: %s",
         data.topic,
         data.data.get("hotword"),
-        payload.decode("utf-8"),
+        payload,
     )
 
 
 @app.on_topic("hermes/dialogueManager/sessionStarted")
 def test_topic2(data: TopicData, payload: bytes):
     """Receive verbatim topic."""
-    _LOGGER.debug("topic2: %s, payload: %s", data.topic, payload.decode("utf-8"))
+    _LOGGER.debug("topic2: %s, payload: %s", data.topic, payload)
 
 
 @app.on_topic("hermes/tts/+")
 def test_topic3(data: TopicData, payload: bytes):
     """Receive topic with wildcard."""
-    _LOGGER.debug("topic3: %s, payload: %s", data.topic, payload.decode("utf-8"))
+    _LOGGER.debug("topic3: %s, payload: %s", data.topic, payload)
 
 
 @app.on_topic("hermes/+/{site_id}/playBytes/#")
@@ -21,7 +21,7 @@ def test_topic1(data: TopicData, payload: bytes):
     elif "playBytes" in data.topic:
         _LOGGER.debug("topic: %s, site_id: %s", data.topic, data.data.get("site_id"))
     else:
-        _LOGGER.debug("topic: %s, payload: %s", data.topic, payload.decode("utf-8"))
+        _LOGGER.debug("topic: %s, payload: %s", data.topic, payload)
 
 
 app.run()
@@ -1,20 +1,101 @@
 """Helper library to create voice apps for Rhasspy using the Hermes protocol."""
 import argparse
 import asyncio
+import collections
+import collections.abc
+import functools
+import importlib
+import json
 import logging
+import os
 import re
+import sys
+import time
+import types
 import typing
 from dataclasses import dataclass
 
 import paho.mqtt.client as mqtt
 import rhasspyhermes.cli as hermes_cli
+from rhasspyhermes.base import Message
 from rhasspyhermes.client import HermesClient
-from rhasspyhermes.dialogue import DialogueContinueSession, DialogueEndSession
+from rhasspyhermes.dialogue import (
+    DialogueContinueSession,
+    DialogueEndSession,
+    DialogueSessionEnded,
+    DialogueSessionStarted,
+)
+from rhasspyhermes.intent import Slot
 from rhasspyhermes.nlu import NluIntent, NluIntentNotRecognized
+from rhasspyhermes.tts import TtsSayFinished
 from rhasspyhermes.wake import HotwordDetected
 
 _LOGGER = logging.getLogger("HermesApp")
 
+_INTENT_NOT_RECOGNIZED_TOPIC = NluIntentNotRecognized.topic()
+
+
+def _priority_message_type(topic: str) -> typing.Optional[typing.Type[Message]]:
+    """Get the type of a message that is dispatched ahead of bulk raw topics.
+
+    This only compares prefixes and suffixes, so it's cheap enough to run on
+    every message, including audio frames.
+    """
+    if topic.startswith("hermes/hotword/"):
+        # hermes/hotword/<wakeword_id>/detected
+        if len(topic) > 24 and topic.endswith("/detected") and "/" not in topic[15:-9]:
+            return HotwordDetected
+    elif topic.startswith("hermes/intent/"):
+        # hermes/intent/<intent_name>
+        if len(topic) > 14:
+            return NluIntent
+    elif topic == _INTENT_NOT_RECOGNIZED_TOPIC:
+        return NluIntentNotRecognized
+
+    return None
+
+
+# Messages with a fixed topic that are dispatched by a lookup of their topic.
+_TYPED_MESSAGE_TOPICS: typing.Dict[str, typing.Type[Message]] = {
+    message_type.topic(): message_type
+    for message_type in (DialogueSessionStarted, DialogueSessionEnded, TtsSayFinished)
+}
+
+
+def _decode_text(payload: typing.Union[str, bytes]) -> str:
+    if isinstance(payload, bytes):
+        return payload.decode("utf-8")
+
+    return payload
+
+
+def _freeze(value: typing.Any) -> typing.Any:
+    if isinstance(value, dict):
+        return types.MappingProxyType(
+            {key: _freeze(item) for key, item in value.items()}
+        )
+
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+
+    return value
+
+
+def _decode_json(payload: typing.Union[str, bytes]) -> typing.Any:
+    # Read-only, because the decoded payload is shared by all callbacks. Freezing
+    # copies the decoded value once more, which takes about as long as json.loads().
+    return _freeze(json.loads(payload))
+
+
+# Decoders for the payloads of raw topics, by name
+_TOPIC_CODECS: typing.Dict[str, typing.Callable[[typing.Any], typing.Any]] = {
+    "json": _decode_json,
+    "text": _decode_text,
+}
+
+# Marks a payload that couldn't be decoded
+_DECODE_ERROR = object()
+
 
 class HermesApp(HermesClient):
     """A Rhasspy app using the Hermes protocol.
@@ -32,6 +113,8 @@ class HermesApp(HermesClient):
         name: str,
         parser: typing.Optional[argparse.ArgumentParser] = None,
         mqtt_client: typing.Optional[mqtt.Client] = None,
+        bulk_starvation_limit: typing.Optional[int] = 10,
+        log_limits: typing.Optional["LogLimits"] = None,
     ):
         """Initialize the Rhasspy Hermes app.
 
@@ -44,6 +127,15 @@ class HermesApp(HermesClient):
 
             mqtt_client (:class:`paho.mqtt.client.Client`, optional): An MQTT client. If the argument
                 is not specified, the object creates an MQTT client itself.
+
+            bulk_starvation_limit (int, optional): The maximum number of hotword and intent
+                messages that are dispatched in a row while raw topic messages are waiting.
+                After this number, one raw topic message is dispatched. If the argument is
+                ``None``, hotword and intent messages always go first.
+
+            log_limits (:class:`LogLimits`, optional): Limits for the warnings and errors the
+                app logs while handling messages. If the argument is not specified, the
+                defaults of :class:`LogLimits` are used.
         """
         if parser is None:
             parser = argparse.ArgumentParser(prog=name)
@@ -71,7 +163,10 @@ class HermesApp(HermesClient):
         self._callbacks_intent: typing.Dict[
             str,
             typing.List[
-                typing.Callable[[NluIntent], typing.Union[ContinueSession, EndSession]]
+                typing.Callable[
+                    [NluIntent, typing.Optional[SlotIndex]],
+                    typing.Union[ContinueSession, EndSession, None],
+                ]
             ],
         ] = {}
 
@@ -81,6 +176,10 @@ class HermesApp(HermesClient):
             ]
         ] = []
 
+        self._callbacks_message: typing.Dict[
+            typing.Type[Message], typing.List[typing.Callable[[typing.Any], None]]
+        ] = {}
+
         self._callbacks_topic: typing.Dict[
             str, typing.List[typing.Callable[[TopicData, bytes], None]]
         ] = {}
@@ -91,7 +190,19 @@ class HermesApp(HermesClient):
 
         self._additional_topic: typing.List[str] = []
 
-    def _subscribe_callbacks(self):
+        self._bulk_starvation_limit = bulk_starvation_limit
+
+        # Modules to reload when their file changes, with their last modification time
+        self._watched_modules: typing.Dict[str, typing.Optional[float]] = {}
+        self._watch_interval = 1.0
+        self._watch_task: typing.Optional[asyncio.Task] = None
+
+        # Set when paho's network traffic is handled in the event loop
+        self._mqtt_in_loop = False
+
+        self._dispatch_logger = _DispatchLogger(_LOGGER, log_limits or LogLimits())
+
+    def _callback_topics(self) -> typing.List[str]:
         # Remove duplicate intent names
         intent_names = list(set(self._callbacks_intent.keys()))
         topics = [
@@ -104,11 +215,325 @@ class HermesApp(HermesClient):
         if self._callbacks_intent_not_recognized:
             topics.append(NluIntentNotRecognized.topic())
 
+        topics.extend(message_type.topic() for message_type in self._callbacks_message)
+
         topic_names = list(set(self._callbacks_topic.keys()))
         topics.extend(topic_names)
         topics.extend(self._additional_topic)
 
-        self.subscribe_topics(*topics)
+        return topics
+
+    def _subscribed_type_topics(self) -> typing.Set[str]:
+        if self.site_ids:
+            return {
+                message_type.topic(site_id=site_id)
+                for message_type in self.subscribed_types
+                for site_id in self.site_ids
+            }
+
+        return {message_type.topic() for message_type in self.subscribed_types}
+
+    def _subscribe_callbacks(self):
+        self.subscribe_topics(*self._callback_topics())
+
+    def _unsubscribe_topics(self, *topics: str):
+        with self.subscribe_lock:
+            for topic in topics:
+                self.pending_mqtt_topics.discard(topic)
+                self.all_mqtt_topics.discard(topic)
+
+                if topic in self.subscribed_topics:
+                    self.mqtt_client.unsubscribe(topic)
+                    self.subscribed_topics.discard(topic)
+                    _LOGGER.debug("Unsubscribed from %s", topic)
+
+    def reload(self, module_name: str) -> bool:
+        """Re-import a module with decorated functions and swap its callbacks.
+
+        The callbacks of functions defined in the module are replaced by the ones
+        registered while re-importing it, and the MQTT subscriptions are updated for
+        the topics that are added or removed. The MQTT connection stays open.
+
+        Args:
+            module_name (str): The name of the module, e.g. ``"time_skill"``.
+
+        Returns:
+            bool: ``True`` if the module has been reloaded, ``False`` if importing it
+            failed. In the latter case, the previous callbacks stay active.
+
+        .. note:: The module should apply the decorators of an existing app, e.g. by
+            importing it with ``from my_app import app``, and it shouldn't call
+            :meth:`run` itself. The module running the app can't be reloaded.
+
+        .. note:: If the app runs and this method is called from another thread, the
+            module is re-imported in the app's event loop and this method waits for
+            it. That way no message is dispatched while the callbacks are swapped.
+        """
+        loop = self.loop
+        if loop is not None and loop.is_running():
+            try:
+                in_loop = asyncio.get_running_loop() is loop
+            except RuntimeError:
+                in_loop = False
+
+            if not in_loop:
+                return asyncio.run_coroutine_threadsafe(
+                    self._reload_async(module_name), loop
+                ).result()
+
+        return self._reload(module_name)
+
+    async def _reload_async(self, module_name: str) -> bool:
+        return self._reload(module_name)
+
+    def _reload(self, module_name: str) -> bool:
+        old_topics = set(self._callback_topics())
+        old_callbacks = (
+            self._callbacks_hotword,
+            self._callbacks_intent,
+            self._callbacks_intent_not_recognized,
+            self._callbacks_message,
+            self._callbacks_topic,
+            self._callbacks_topic_regex,
+            self._additional_topic,
+        )
+
+        def keep(function) -> bool:
+            return getattr(function, "__module__", None) != module_name
+
+        def keep_all(callbacks):
+            kept_callbacks = {}
+            for name, functions in callbacks.items():
+                kept_functions = list(filter(keep, functions))
+                if kept_functions:
+                    kept_callbacks[name] = kept_functions
+
+            return kept_callbacks
+
+        # Decorators add the callbacks of the re-imported module to these copies.
+        self._callbacks_hotword = list(filter(keep, self._callbacks_hotword))
+        self._callbacks_intent = keep_all(self._callbacks_intent)
+        self._callbacks_intent_not_recognized = list(
+            filter(keep, self._callbacks_intent_not_recognized)
+        )
+        self._callbacks_message = keep_all(self._callbacks_message)
+        self._callbacks_topic = keep_all(self._callbacks_topic)
+        self._callbacks_topic_regex = list(filter(keep, self._callbacks_topic_regex))
+        self._additional_topic = [
+            topic_name
+            for function in self._callbacks_topic_regex
+            for topic_name in getattr(function, "additional_topic", [])
+        ]
+
+        try:
+            if module_name in sys.modules:
+                importlib.reload(sys.modules[module_name])
+            else:
+                importlib.import_module(module_name)
+        except Exception:
+            _LOGGER.exception("Cannot reload module %s", module_name)
+            (
+                self._callbacks_hotword,
+                self._callbacks_intent,
+                self._callbacks_intent_not_recognized,
+                self._callbacks_message,
+                self._callbacks_topic,
+                self._callbacks_topic_regex,
+                self._additional_topic,
+            ) = old_callbacks
+            return False
+
+        # Topics of subscribed message types are still needed by on_message.
+        new_topics = set(self._callback_topics())
+        self._unsubscribe_topics(
+            *(old_topics - new_topics - self._subscribed_type_topics())
+        )
+        self.subscribe_topics(*(new_topics - old_topics))
+        _LOGGER.info("Reloaded module %s", module_name)
+
+        return True
+
+    def watch(self, *module_names: str, interval: float = 1.0):
+        """Reload modules with decorated functions when their source file changes.
+
+        The app checks the modification time of the modules' files while it runs
+        and calls :meth:`reload` for each module that has changed. You can call this
+        method before or while the app runs.
+
+        Args:
+            *module_names (str): Names of the modules you want to reload.
+
+            interval (float): The number of seconds between two checks.
+
+        Example:
+
+        .. code-block:: python
+
+            app = HermesApp("TimeApp")
+            app.reload("time_skill")
+            app.watch("time_skill")
+            app.run()
+        """
+        for module_name in module_names:
+            self._watched_modules[module_name] = self._module_mtime(module_name)
+
+        self._watch_interval = interval
+
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._start_watching)
+
+    def _start_watching(self):
+        if self._watched_modules and self._watch_task is None:
+            self._watch_task = asyncio.ensure_future(
+                self._watch_modules_async(), loop=self.loop
+            )
+
+    def _stop_watching(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+
+    @staticmethod
+    def _module_mtime(module_name: str) -> typing.Optional[float]:
+        module = sys.modules.get(module_name)
+        path = getattr(module, "__file__", None)
+        if path is None:
+            return None
+
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    async def _watch_modules_async(self):
+        while True:
+            await asyncio.sleep(self._watch_interval)
+            for module_name, mtime in list(self._watched_modules.items()):
+                try:
+                    new_mtime = self._module_mtime(module_name)
+                    if new_mtime is not None and new_mtime != mtime:
+                        _LOGGER.debug("Module %s changed", module_name)
+                        self._watched_modules[module_name] = new_mtime
+                        self.reload(module_name)
+                except Exception:
+                    _LOGGER.exception("Cannot reload module %s", module_name)
+
+    async def handle_messages_async(
+        self, loop: typing.Optional[asyncio.AbstractEventLoop] = None
+    ):
+        """Handles MQTT messages in the event loop.
+
+        Hotword and intent messages are dispatched ahead of messages on other topics,
+        so a backlog of raw topic messages (such as audio frames) doesn't delay them.
+        Messages are handled one after another: :meth:`on_raw_message` finishes before
+        the next message is taken from the queue.
+
+        Messages of the types you subscribed to with :meth:`subscribe` are still passed
+        to :meth:`on_message_blocking` and :meth:`on_message`.
+
+        Args:
+            loop (:class:`asyncio.AbstractEventLoop`, optional): The event loop to run in.
+                If the argument is not specified, the running event loop is used.
+        """
+        self.loop = loop or self.loop or asyncio.get_running_loop()
+        self.in_queue = _MessageLaneQueue(self._bulk_starvation_limit)
+
+        # Pull in messages from pre-queue
+        while self.pre_queue.qsize() > 0:
+            self.in_queue.put_nowait(self.pre_queue.get_nowait())
+
+        self._start_watching()
+
+        # Main loop
+        try:
+            while True:
+                try:
+                    mqtt_message = await self.in_queue.get()
+                    if mqtt_message is None:
+                        break
+
+                    await self.on_raw_message(mqtt_message.topic, mqtt_message.payload)
+
+                    if self.subscribed_types:
+                        await self._handle_typed_message_async(mqtt_message)
+
+                    # Let the MQTT thread enqueue newly received messages, so a
+                    # priority message can overtake the remaining backlog.
+                    await asyncio.sleep(0)
+                except KeyboardInterrupt:
+                    break
+                except asyncio.CancelledError:
+                    break
+                except Exception:
+                    _LOGGER.exception("handle_messages_async")
+                    break
+        finally:
+            self._stop_watching()
+
+    async def _handle_typed_message_async(self, mqtt_message):
+        # Same as HermesClient.handle_messages_async for subscribed message types
+        for message, site_id, session_id in HermesClient.parse_mqtt_message(
+            mqtt_message.topic,
+            mqtt_message.payload,
+            self.subscribed_types,
+            logger=_LOGGER,
+        ):
+            if not self.valid_site_id(site_id):
+                continue
+
+            # Publish all responses (blocking)
+            await self.publish_all(
+                self.on_message_blocking(
+                    message,
+                    site_id=site_id,
+                    session_id=session_id,
+                    topic=mqtt_message.topic,
+                )
+            )
+
+            # Publish all responses (non-blocking)
+            asyncio.create_task(
+                self.publish_all(
+                    self.on_message(
+                        message,
+                        site_id=site_id,
+                        session_id=session_id,
+                        topic=mqtt_message.topic,
+                    )
+                )
+            )
+
+    def mqtt_on_disconnect(self, client, userdata, rc, *args):
+        """Disconnected from MQTT broker."""
+        # paho calls on_disconnect(client, userdata, rc), not with the flags that the
+        # base class expects. Reconnecting is left to the MQTT client's thread or, if
+        # MQTT runs in the event loop, to _MqttLoopAdapter.
+        try:
+            if rc == mqtt.MQTT_ERR_SUCCESS:
+                _LOGGER.debug("Disconnected from MQTT broker")
+            else:
+                _LOGGER.warning("Disconnected. Trying to reconnect...")
+
+            if self.loop:
+                if self._mqtt_in_loop:
+                    self.mqtt_connected_event.clear()
+                else:
+                    self.loop.call_soon_threadsafe(self.mqtt_connected_event.clear)
+
+            self.is_connected = False
+        except Exception:
+            _LOGGER.exception("on_disconnect")
+
+    def mqtt_on_message(self, client, userdata, msg):
+        """Received message from MQTT broker."""
+        if self._mqtt_in_loop and self.in_queue is not None:
+            # Called in the event loop, so no handoff between threads is needed
+            try:
+                self.in_queue.put_nowait(msg)
+            except Exception:
+                _LOGGER.exception("mqtt_on_message")
+        else:
+            super().mqtt_on_message(client, userdata, msg)
 
     async def on_raw_message(self, topic: str, payload: bytes):
         """This method handles messages from the MQTT broker.
@@ -121,29 +546,62 @@ class HermesApp(HermesClient):
         .. warning:: Don't override this method in your app. This is where all the magic happens in Rhasspy Hermes App.
         """
         try:
-            if HotwordDetected.is_topic(topic):
+            priority_type = _priority_message_type(topic)
+            typed_message = False
+            message_type = _TYPED_MESSAGE_TOPICS.get(topic)
+            if message_type in self._callbacks_message:
+                # hermes/dialogueManager/sessionStarted, hermes/tts/sayFinished, ...
+                typed_message = True
+                try:
+                    message = message_type.from_json(payload)
+                    for function_m in self._callbacks_message[message_type]:
+                        function_m(message)
+                except KeyError as key:
+                    self._dispatch_logger.log(
+                        logging.ERROR,
+                        "Missing key %s in JSON payload for %s: %s",
+                        key,
+                        topic=topic,
+                        payload=payload,
+                    )
+
+            if priority_type is HotwordDetected:
                 # hermes/hotword/<wakeword_id>/detected
                 try:
                     hotword_detected = HotwordDetected.from_json(payload)
                     for function_h in self._callbacks_hotword:
                         function_h(hotword_detected)
                 except KeyError as key:
-                    _LOGGER.error(
-                        "Missing key %s in JSON payload for %s: %s", key, topic, payload
+                    self._dispatch_logger.log(
+                        logging.ERROR,
+                        "Missing key %s in JSON payload for %s: %s",
+                        key,
+                        topic=topic,
+                        payload=payload,
                     )
-            elif NluIntent.is_topic(topic):
+            elif priority_type is NluIntent:
                 # hermes/intent/<intent_name>
                 try:
                     nlu_intent = NluIntent.from_json(payload)
                     intent_name = nlu_intent.intent.intent_name
                     if intent_name in self._callbacks_intent:
+                        # Shared by all handlers of this intent that want it
+                        slots: typing.Optional[SlotIndex] = None
                         for function_i in self._callbacks_intent[intent_name]:
-                            function_i(nlu_intent)
+                            if slots is None and getattr(
+                                function_i, "slot_index", False
+                            ):
+                                slots = SlotIndex(nlu_intent.slots)
+                            function_i(nlu_intent, slots)
                 except KeyError as key:
-                    _LOGGER.error(
-                        "Missing key %s in JSON payload for %s: %s", key, topic, payload
+                    self._dispatch_logger.log(
+                        logging.ERROR,
+                        "Missing key %s in JSON payload for %s: %s",
+                        key,
+                        topic=topic,
+                        payload=payload,
                     )
-            elif NluIntentNotRecognized.is_topic(topic):
+            elif priority_type is NluIntentNotRecognized:
                 # hermes/nlu/intentNotRecognized
                 try:
                     nlu_intent_not_recognized = NluIntentNotRecognized.from_json(
@@ -152,35 +610,95 @@ class HermesApp(HermesClient):
                     for function_inr in self._callbacks_intent_not_recognized:
                         function_inr(nlu_intent_not_recognized)
                 except KeyError as key:
-                    _LOGGER.error(
-                        "Missing key %s in JSON payload for %s: %s", key, topic, payload
+                    self._dispatch_logger.log(
+                        logging.ERROR,
+                        "Missing key %s in JSON payload for %s: %s",
+                        key,
+                        topic=topic,
+                        payload=payload,
                     )
             else:
-                unexpected_topic = True
+                unexpected_topic = not typed_message
+
+                # Decoded payloads by codec, shared by all callbacks
+                decoded: typing.Dict[typing.Callable, typing.Any] = {}
+
                 if topic in self._callbacks_topic:
                     for function_1 in self._callbacks_topic[topic]:
-                        function_1(TopicData(topic, {}), payload)
+                        self._call_topic_callback(
+                            function_1, TopicData(topic, {}), payload, decoded
+                        )
                         unexpected_topic = False
                 else:
+                    # Extracted placeholders by topic name (None if it doesn't
+                    # match), reused for all callbacks with the same topic name
+                    placeholders: typing.Dict[
+                        str, typing.Optional[typing.Dict[str, str]]
+                    ] = {}
+                    parts: typing.Optional[typing.List[str]] = None
                     for function_2 in self._callbacks_topic_regex:
-                        if hasattr(function_2, "topic_extras"):
-                            topic_extras = getattr(function_2, "topic_extras")
-                            for pattern, named_positions in topic_extras:
-                                if re.match(pattern, topic) is not None:
-                                    data = TopicData(topic, {})
-                                    parts = topic.split(sep="/")
-                                    if named_positions is not None:
-                                        for name, position in named_positions.items():
-                                            data.data[name] = parts[position]
-
-                                    function_2(data, payload)
-                                    unexpected_topic = False
+                        topic_extras = getattr(function_2, "topic_extras", [])
+                        for pattern, named_positions, topic_name in topic_extras:
+                            if topic_name in placeholders:
+                                values = placeholders[topic_name]
+                            elif pattern.match(topic) is not None:
+                                values = {}
+                                if named_positions is not None:
+                                    if parts is None:
+                                        parts = topic.split(sep="/")
+                                    for name, position in named_positions.items():
+                                        values[name] = parts[position]
+
+                                placeholders[topic_name] = values
+                            else:
+                                values = placeholders[topic_name] = None
+
+                            if values is not None:
+                                # Each callback gets its own topic data
+                                self._call_topic_callback(
+                                    function_2,
+                                    TopicData(topic, dict(values)),
+                                    payload,
+                                    decoded,
+                                )
+                                unexpected_topic = False
 
                 if unexpected_topic:
-                    _LOGGER.warning("Unexpected topic: %s", topic)
+                    self._dispatch_logger.log(
+                        logging.WARNING, "Unexpected topic: %s", topic=topic
+                    )
 
         except Exception:
-            _LOGGER.exception("on_raw_message")
+            self._dispatch_logger.log(
+                logging.ERROR, "on_raw_message (topic=%s)", topic=topic, exc_info=True
+            )
+
+    def _call_topic_callback(
+        self,
+        function: typing.Callable[["TopicData", typing.Any], None],
+        data: "TopicData",
+        payload: bytes,
+        decoded: typing.Dict[typing.Callable, typing.Any],
+    ):
+        codec = getattr(function, "codec", None)
+        if codec is None:
+            function(data, payload)
+            return
+
+        if codec not in decoded:
+            try:
+                decoded[codec] = codec(payload)
+            except ValueError:
+                decoded[codec] = _DECODE_ERROR
+                self._dispatch_logger.log(
+                    logging.ERROR,
+                    "Cannot decode payload for %s: %s",
+                    topic=data.topic,
+                    payload=payload,
+                )
+
+        if decoded[codec] is not _DECODE_ERROR:
+            function(data, decoded[codec])
 
     def on_hotword(self, function):
         """Apply this decorator to a function that you want to act on a detected hotword.
@@ -202,16 +720,84 @@ class HermesApp(HermesClient):
 
         return function
 
-    def on_intent(self, *intent_names: str):
+    def _on_message(self, message_type: typing.Type[Message], function):
+        try:
+            self._callbacks_message[message_type].append(function)
+        except KeyError:
+            self._callbacks_message[message_type] = [function]
+
+        return function
+
+    def on_session_started(self, function):
+        """Apply this decorator to a function that you want to act on a started session.
+
+        The function needs to have the following signature:
+
+        function(session_started: :class:`rhasspyhermes.dialogue.DialogueSessionStarted`)
+
+        Example:
+
+        .. code-block:: python
+
+            @app.on_session_started
+            def session_started(session_started):
+                print(f"Session {session_started.session_id} started on site {session_started.site_id}")
+        """
+        return self._on_message(DialogueSessionStarted, function)
+
+    def on_session_ended(self, function):
+        """Apply this decorator to a function that you want to act on an ended session.
+
+        The function needs to have the following signature:
+
+        function(session_ended: :class:`rhasspyhermes.dialogue.DialogueSessionEnded`)
+
+        Example:
+
+        .. code-block:: python
+
+            @app.on_session_ended
+            def session_ended(session_ended):
+                print(f"Session {session_ended.session_id} ended: {session_ended.termination.reason}")
+        """
+        return self._on_message(DialogueSessionEnded, function)
+
+    def on_tts_finished(self, function):
+        """Apply this decorator to a function that you want to act when the TTS system
+        has finished speaking.
+
+        The function needs to have the following signature:
+
+        function(say_finished: :class:`rhasspyhermes.tts.TtsSayFinished`)
+
+        Example:
+
+        .. code-block:: python
+
+            @app.on_tts_finished
+            def tts_finished(say_finished):
+                print(f"Finished speaking on site {say_finished.site_id}")
+        """
+        return self._on_message(TtsSayFinished, function)
+
+    def on_intent(self, *intent_names: str, slot_index: bool = False):
         """Apply this decorator to a function that you want to act on a received intent.
 
         Args:
             *intent_names (str): Names of the intents you want the function to act on.
 
+            slot_index (bool): Whether the function also receives a :class:`SlotIndex`
+                of the intent's slots. The index is built once per message and shared
+                by all functions acting on the same intent.
+
         The function needs to have the following signature:
 
         function(intent: :class:`rhasspyhermes.nlu.NluIntent`)
 
+        or, if ``slot_index`` is ``True``:
+
+        function(intent: :class:`rhasspyhermes.nlu.NluIntent`, slots: :class:`SlotIndex`)
+
         Example:
 
         .. code-block:: python
@@ -219,11 +805,21 @@ class HermesApp(HermesClient):
             @app.on_intent("GetTime")
             def get_time(intent: NluIntent):
                 return EndSession("It's too late.")
+
+            @app.on_intent("SetTimer", slot_index=True)
+            def set_timer(intent: NluIntent, slots: SlotIndex):
+                return EndSession(f"Timer set for {slots.value('minutes')} minutes.")
         """
 
         def wrapper(function):
-            def wrapped(intent: NluIntent):
-                message = function(intent)
+            @functools.wraps(function, updated=())
+            def wrapped(intent: NluIntent, slots: typing.Optional[SlotIndex] = None):
+                if slot_index:
+                    if slots is None:
+                        slots = SlotIndex(intent.slots)
+                    message = function(intent, slots)
+                else:
+                    message = function(intent)
                 if isinstance(message, EndSession):
                     if intent.session_id is not None:
                         self.publish(
@@ -255,6 +851,8 @@ class HermesApp(HermesClient):
                             "Cannot continue session of intent without session ID."
                         )
 
+            setattr(wrapped, "slot_index", slot_index)
+
             for intent_name in intent_names:
                 try:
                     self._callbacks_intent[intent_name].append(wrapped)
@@ -283,6 +881,7 @@ class HermesApp(HermesClient):
         """
 
         def wrapper(function):
+            @functools.wraps(function, updated=())
             def wrapped(inr: NluIntentNotRecognized):
                 message = function(inr)
                 if isinstance(message, EndSession):
@@ -322,12 +921,22 @@ class HermesApp(HermesClient):
 
         return wrapper
 
-    def on_topic(self, *topic_names: str):
+    def on_topic(
+        self,
+        *topic_names: str,
+        decode: typing.Union[str, typing.Callable[[bytes], typing.Any], None] = None,
+    ):
         """Apply this decorator to a function that you want to act on a received raw MQTT message.
 
         Args:
             *topic_names (str): The MQTT topics you want the function to act on.
 
+            decode (str or callable, optional): How to decode the payload before it's passed
+                to the function: ``"json"`` for a read-only JSON value, ``"text"`` for a
+                UTF-8 string, or a function that decodes the payload and raises
+                :class:`ValueError` if it can't. If the argument is not specified, the
+                function receives the payload as bytes.
+
         The function needs to have the following signature:
 
         function(data: :class:`TopicData`, payload: bytes)
@@ -340,15 +949,40 @@ class HermesApp(HermesClient):
             def test_topic1(data: TopicData, payload: bytes):
                 _LOGGER.debug("topic: %s, site_id: %s", data.topic, data.data.get("site_id"))
 
+            @app.on_topic("hermes/dialogueManager/sessionStarted", decode="json")
+            def test_topic2(data: TopicData, payload: typing.Mapping[str, typing.Any]):
+                _LOGGER.debug("session_id: %s", payload["sessionId"])
+
         .. note:: The topic names can contain MQTT wildcards (`+` and `#`) or templates (`{foobar}`).
             In the latter case the value of the named template is available in the decorated function
             as part of the ``data`` argument.
+
+        .. note:: The payload is decoded once per message, and all functions acting on the
+            message with the same ``decode`` argument receive the same object. A custom
+            decoding function should return an object that can't be modified.
+
+        .. note:: With ``decode="json"``, JSON objects are :class:`types.MappingProxyType`
+            and arrays are tuples, not ``dict`` and ``list``. So ``isinstance(payload, dict)``
+            is ``False`` and :func:`json.dumps` can't serialize the payload. Use
+            ``decode=json.loads`` to get a mutable ``dict`` instead, which you shouldn't
+            modify because it's shared.
         """
+        codec: typing.Optional[typing.Callable[[typing.Any], typing.Any]]
+        if isinstance(decode, str):
+            try:
+                codec = _TOPIC_CODECS[decode]
+            except KeyError as error:
+                raise ValueError(f"Unknown decode mode: {decode}") from error
+        else:
+            codec = decode
 
         def wrapper(function):
+            @functools.wraps(function, updated=())
             def wrapped(data: TopicData, payload: bytes):
                 function(data, payload)
 
+            wrapped.codec = codec
+
             replaced_topic_names = []
 
             for topic_name in topic_names:
@@ -406,10 +1040,12 @@ class HermesApp(HermesClient):
                         (
                             re.compile(pattern),
                             named_positions if len(named_positions) > 0 else None,
+                            topic_name,
                         )
                     )
 
             if hasattr(wrapped, "topic_extras"):
+                wrapped.additional_topic = replaced_topic_names
                 self._callbacks_topic_regex.append(wrapped)
                 self._additional_topic.extend(replaced_topic_names)
 
@@ -417,28 +1053,401 @@ class HermesApp(HermesClient):
 
         return wrapper
 
-    def run(self):
+    def run(
+        self,
+        loop_policy: typing.Union[str, asyncio.AbstractEventLoopPolicy, None] = None,
+        mqtt_in_loop: bool = False,
+    ):
         """Run the app. This method:
 
         - subscribes to all MQTT topics for the functions you decorated;
         - connects to the MQTT broker;
         - starts the MQTT event loop and reacts to received MQTT messages.
+
+        Args:
+            loop_policy (str or :class:`asyncio.AbstractEventLoopPolicy`, optional): The event
+                loop implementation to run the app in: ``"asyncio"`` for the default one,
+                ``"uvloop"`` for `uvloop <https://github.com/MagicStack/uvloop>`_, ``"auto"``
+                for uvloop if it's installed and the default one otherwise, or an event loop
+                policy. If the argument is not specified, the current policy is used.
+
+            mqtt_in_loop (bool): Whether the MQTT client's network traffic is handled in the
+                event loop instead of in a separate thread. This saves a handoff between
+                threads for each received message. Reconnecting to the broker then blocks
+                the event loop during each attempt.
         """
+        _set_event_loop_policy(loop_policy)
+
         # Subscribe to callbacks
         self._subscribe_callbacks()
 
-        # Try to connect
-        _LOGGER.debug("Connecting to %s:%s", self.args.host, self.args.port)
-        hermes_cli.connect(self.mqtt_client, self.args)
-        self.mqtt_client.loop_start()
+        if mqtt_in_loop:
+            main = self._handle_messages_mqtt_in_loop_async()
+        else:
+            # Try to connect
+            _LOGGER.debug("Connecting to %s:%s", self.args.host, self.args.port)
+            hermes_cli.connect(self.mqtt_client, self.args)
+            self.mqtt_client.loop_start()
+            main = self.handle_messages_async()
 
         try:
             # Run main loop
-            asyncio.run(self.handle_messages_async())
+            asyncio.run(main)
         except KeyboardInterrupt:
             pass
         finally:
-            self.mqtt_client.loop_stop()
+            if not mqtt_in_loop:
+                self.mqtt_client.loop_stop()
+
+    async def _handle_messages_mqtt_in_loop_async(self):
+        self.loop = asyncio.get_running_loop()
+        self._mqtt_in_loop = True
+        _MqttLoopAdapter(self.loop, self.mqtt_client)
+
+        # Try to connect
+        _LOGGER.debug("Connecting to %s:%s", self.args.host, self.args.port)
+        hermes_cli.connect(self.mqtt_client, self.args)
+
+        await self.handle_messages_async()
+
+
+def _set_event_loop_policy(
+    loop_policy: typing.Union[str, asyncio.AbstractEventLoopPolicy, None]
+):
+    if loop_policy is None:
+        return
+
+    policy: asyncio.AbstractEventLoopPolicy
+    if loop_policy == "asyncio":
+        policy = asyncio.DefaultEventLoopPolicy()
+    elif loop_policy in ("uvloop", "auto"):
+        try:
+            import uvloop  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            if loop_policy == "uvloop":
+                raise
+
+            _LOGGER.debug("uvloop isn't installed, using default event loop")
+            return
+
+        policy = uvloop.EventLoopPolicy()
+    elif isinstance(loop_policy, str):
+        raise ValueError(f"Unknown event loop policy: {loop_policy}")
+    else:
+        policy = loop_policy
+
+    asyncio.set_event_loop_policy(policy)
+
+
+class _MqttLoopAdapter:
+    """Handles the network traffic of a paho MQTT client in an asyncio event loop.
+
+    The client's socket is watched with the loop's readers and writers, and a task
+    calls :meth:`paho.mqtt.client.Client.loop_misc` every second for keepalives.
+    When the socket is closed, another task reconnects with an exponential backoff
+    between ``reconnect_delay_min`` and ``reconnect_delay_max`` seconds, like
+    :meth:`paho.mqtt.client.Client.loop_forever` does. It stops after
+    :meth:`paho.mqtt.client.Client.disconnect` has been called.
+
+    .. note:: :meth:`paho.mqtt.client.Client.reconnect` resolves the broker's host
+        name and connects to it synchronously, so each reconnection attempt blocks
+        the event loop until it succeeds or fails.
+    """
+
+    reconnect_delay_min = 1.0
+    reconnect_delay_max = 120.0
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, client: mqtt.Client):
+        self.loop = loop
+        self.client = client
+        self.misc_task: typing.Optional[asyncio.Task] = None
+        self.reconnect_task: typing.Optional[asyncio.Task] = None
+
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_socket_open(self, client, userdata, sock):
+        """Start reading from the socket."""
+        self.loop.add_reader(sock, self.read)
+        self.misc_task = self.loop.create_task(self.misc_loop())
+
+        if self.reconnect_task is not None:
+            self.reconnect_task.cancel()
+            self.reconnect_task = None
+
+    def on_socket_close(self, client, userdata, sock):
+        """Stop reading from the socket."""
+        self.loop.remove_reader(sock)
+        self.loop.remove_writer(sock)
+        if self.misc_task is not None:
+            self.misc_task.cancel()
+            self.misc_task = None
+
+        if (
+            self.reconnect_task is None
+            and not self.is_disconnecting()
+            and not self.loop.is_closed()
+        ):
+            self.reconnect_task = self.loop.create_task(self.reconnect_loop())
+
+    def on_socket_register_write(self, client, userdata, sock):
+        """Write to the socket when it's ready."""
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        """Stop writing to the socket."""
+        self.loop.remove_writer(sock)
+
+    def read(self):
+        """Read from the socket, including data that is already buffered by TLS."""
+        while self.client.loop_read() == mqtt.MQTT_ERR_SUCCESS:
+            # Decrypted bytes in the SSL object don't make the socket readable again
+            sock = self.client.socket()
+            if not hasattr(sock, "pending") or not sock.pending():
+                break
+
+    def is_disconnecting(self) -> bool:
+        """Check if the client has been disconnected on purpose."""
+        # pylint: disable=protected-access
+        return self.client._state == mqtt.mqtt_cs_disconnecting
+
+    async def misc_loop(self):
+        """Handle keepalives and retries while the client is connected."""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    async def reconnect_loop(self):
+        """Reconnect to the MQTT broker until it succeeds."""
+        delay = self.reconnect_delay_min
+        while self.client.socket() is None and not self.is_disconnecting():
+            try:
+                _LOGGER.debug("Reconnecting to MQTT broker")
+                self.client.reconnect()
+            except OSError as error:
+                _LOGGER.warning(
+                    "Cannot reconnect to MQTT broker (%s), retrying in %s second(s)",
+                    error,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_delay_max)
+
+        self.reconnect_task = None
+
+
+class _MessageLaneQueue(asyncio.Queue):
+    """Queue of MQTT messages with a priority lane for hotwords and intents.
+
+    Messages on other topics go to the bulk lane. After ``starvation_limit``
+    consecutive priority messages while the bulk lane isn't empty, one bulk
+    message is returned. The ``None`` sentinel goes to the bulk lane, so messages
+    that are already queued are still handled before the main loop stops.
+    """
+
+    def __init__(self, starvation_limit: typing.Optional[int] = None, maxsize=0):
+        self._starvation_limit = starvation_limit
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self._priority: typing.Deque[typing.Any] = collections.deque()
+        self._bulk: typing.Deque[typing.Any] = collections.deque()
+        self._priority_streak = 0
+
+    def _put(self, item):
+        if item is not None and _priority_message_type(item.topic) is not None:
+            self._priority.append(item)
+        else:
+            self._bulk.append(item)
+
+    def _get(self):
+        if not self._bulk:
+            self._priority_streak = 0
+            return self._priority.popleft()
+
+        if self._priority and (
+            self._starvation_limit is None
+            or self._priority_streak < self._starvation_limit
+        ):
+            self._priority_streak += 1
+            return self._priority.popleft()
+
+        self._priority_streak = 0
+        return self._bulk.popleft()
+
+    def qsize(self):
+        return len(self._priority) + len(self._bulk)
+
+    def empty(self):
+        return not (self._priority or self._bulk)
+
+
+class _LoggedPayload:
+    """Payload that is only converted to a (truncated) string when it's logged."""
+
+    __slots__ = ("payload", "limit")
+
+    def __init__(self, payload: typing.Union[str, bytes], limit: typing.Optional[int]):
+        self.payload = payload
+        self.limit = limit
+
+    def __str__(self):
+        if self.limit is not None and len(self.payload) > self.limit:
+            return f"{self.payload[:self.limit]!r}... ({len(self.payload)} bytes)"
+
+        return repr(self.payload)
+
+
+@dataclass
+class _LogCounter:
+    """Number of logged and dropped messages with the same text in an interval."""
+
+    start: float
+    level: int
+    count: int = 0
+    dropped: int = 0
+    last_topic: str = ""
+
+
+class _DispatchLogger:
+    """Rate-limited logger for the message dispatcher.
+
+    Messages are counted per format string, whatever their topic, so a stream of
+    messages on unique topics (such as ``hermes/audioServer/<site_id>/playBytes/<id>``)
+    is limited as well. Within each interval of ``limits.interval`` seconds, the
+    first ``limits.burst`` messages are logged, and after that one in every
+    ``limits.sample`` messages. When the interval expires, the number of dropped
+    messages is logged, even if no other message with the same text follows.
+
+    Each record gets the ``topic`` and ``payload_size`` attributes, so handlers
+    with a structured formatter can use them.
+    """
+
+    def __init__(self, logger: logging.Logger, limits: "LogLimits"):
+        self.logger = logger
+        self.limits = limits
+        self._counters: typing.Dict[str, _LogCounter] = {}
+        self._flush_handle: typing.Optional[asyncio.TimerHandle] = None
+
+    def log(
+        self,
+        level: int,
+        msg: str,
+        *args,
+        topic: str,
+        payload: typing.Union[str, bytes, None] = None,
+        exc_info: bool = False,
+    ):
+        """Log a message about an MQTT message unless the rate limit is reached.
+
+        The topic is added to the arguments of ``msg``, followed by the payload
+        if it's given.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+
+        limits = self.limits
+        now = time.monotonic()
+        counter = self._counters.get(msg)
+        if counter is not None and now - counter.start >= limits.interval:
+            self.flush(now)
+            counter = None
+
+        if counter is None:
+            counter = self._counters[msg] = _LogCounter(now, level)
+
+        counter.count += 1
+        if limits.burst is not None and counter.count > limits.burst:
+            if not limits.sample or (counter.count - limits.burst) % limits.sample != 0:
+                counter.dropped += 1
+                counter.last_topic = topic
+                self._schedule_flush(counter.start + limits.interval - now)
+                return
+
+        args = args + (topic,)
+        if payload is not None:
+            args = args + (_LoggedPayload(payload, limits.max_payload),)
+
+        self.logger.log(
+            level,
+            msg,
+            *args,
+            exc_info=exc_info,
+            extra={
+                "topic": topic,
+                "payload_size": len(payload) if payload is not None else None,
+            },
+        )
+
+    def flush(self, now: typing.Optional[float] = None):
+        """Log the number of dropped messages for each expired interval."""
+        if now is None:
+            now = time.monotonic()
+
+        for msg, counter in list(self._counters.items()):
+            if now - counter.start < self.limits.interval:
+                continue
+
+            del self._counters[msg]
+            if counter.dropped > 0:
+                self.logger.log(
+                    counter.level,
+                    "Dropped %s message(s) like %r, last topic: %s",
+                    counter.dropped,
+                    msg,
+                    counter.last_topic,
+                    extra={"topic": counter.last_topic, "payload_size": None},
+                )
+
+    def _schedule_flush(self, delay: float):
+        if self._flush_handle is not None:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Flushed by the next message after the interval
+            return
+
+        self._flush_handle = loop.call_later(max(delay, 0.0), self._on_flush_timer)
+
+    def _on_flush_timer(self):
+        self._flush_handle = None
+        self.flush()
+
+        # Counters with dropped messages in a later interval
+        now = time.monotonic()
+        pending = [
+            counter.start + self.limits.interval - now
+            for counter in self._counters.values()
+            if counter.dropped > 0
+        ]
+        if pending:
+            self._schedule_flush(min(pending))
+
+
+@dataclass
+class LogLimits:
+    """Limits for the warnings and errors a :class:`HermesApp` logs while handling messages.
+
+    This prevents a stream of unexpected messages, such as misrouted audio frames,
+    from flooding the logs.
+
+    Attributes:
+        max_payload (int, optional): The maximum number of bytes of a payload that are
+            logged. If ``None``, the whole payload is logged.
+        burst (int, optional): The number of log messages with the same text that are
+            logged per interval, whatever their topic. If ``None``, all messages are logged.
+        interval (float): The length of an interval in seconds.
+        sample (int): After the burst, log one in this number of messages. If 0, no
+            messages are logged until the next interval.
+    """
+
+    max_payload: typing.Optional[int] = 64
+    burst: typing.Optional[int] = 10
+    interval: float = 60.0
+    sample: int = 100
 
 
 @dataclass
@@ -486,3 +1495,85 @@ class TopicData:
 
     topic: str
     data: typing.Dict[str, str]
+
+
+class SlotIndex(collections.abc.Mapping):
+    """Read-only index of the slots of an intent, keyed by slot name.
+
+    A :class:`SlotIndex` maps each slot name to the first slot with that name. Use
+    :meth:`all` to get all slots with the same name.
+
+    Example:
+
+    .. code-block:: python
+
+        slots = SlotIndex(intent.slots)
+        minutes = slots.value("minutes", 5)
+    """
+
+    def __init__(self, slots: typing.Optional[typing.Iterable[Slot]] = None):
+        """Initialize the slot index.
+
+        Args:
+            slots (Iterable[:class:`rhasspyhermes.intent.Slot`], optional): The slots to index.
+        """
+        self._slots: typing.Dict[str, typing.List[Slot]] = {}
+        for slot in slots or []:
+            try:
+                self._slots[slot.slot_name].append(slot)
+            except KeyError:
+                self._slots[slot.slot_name] = [slot]
+
+    def __getitem__(self, slot_name: str) -> Slot:
+        return self._slots[slot_name][0]
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self._slots)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def all(self, slot_name: str) -> typing.Tuple[Slot, ...]:
+        """Get all slots with the given name.
+
+        Args:
+            slot_name (str): The name of the slot.
+
+        Returns:
+            Tuple[:class:`rhasspyhermes.intent.Slot`, ...]: The slots, in the order of the intent.
+        """
+        return tuple(self._slots.get(slot_name, ()))
+
+    def entity(
+        self, slot_name: str, default: typing.Optional[str] = None
+    ) -> typing.Optional[str]:
+        """Get the entity of a slot.
+
+        Args:
+            slot_name (str): The name of the slot.
+            default (str, optional): The value to return if the intent has no such slot.
+        """
+        slots = self._slots.get(slot_name)
+        return slots[0].entity if slots else default
+
+    def value(self, slot_name: str, default: typing.Any = None) -> typing.Any:
+        """Get the resolved value of a slot.
+
+        Args:
+            slot_name (str): The name of the slot.
+            default (Any, optional): The value to return if the intent has no such slot.
+        """
+        slots = self._slots.get(slot_name)
+        return slots[0].value.get("value", default) if slots else default
+
+    def raw_value(
+        self, slot_name: str, default: typing.Optional[str] = None
+    ) -> typing.Optional[str]:
+        """Get the raw value of a slot, as it was in the input.
+
+        Args:
+            slot_name (str): The name of the slot.
+            default (str, optional): The value to return if the intent has no such slot.
+        """
+        slots = self._slots.get(slot_name)
+        return slots[0].raw_value if slots else default
@@ -0,0 +1,121 @@
+"""Measure the latency between publishing an MQTT message and handling it in a HermesApp.
+
+The benchmark runs each combination of event loop policy and MQTT mode in a separate
+process, interleaved over a number of rounds, and reports the median and 90th
+percentile latency of each run. It needs a running MQTT broker, e.g.:
+
+    mosquitto -p 1883 &
+    python3 scripts/benchmark_latency.py --host localhost --port 1883 --rounds 5
+"""
+# pylint: disable=wrong-import-position
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import paho.mqtt.client as mqtt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from rhasspyhermes_app import HermesApp  # noqa: E402
+
+TOPIC = "benchmark/latency"
+CONFIGURATIONS = [
+    ("asyncio", False),
+    ("asyncio", True),
+    ("uvloop", False),
+    ("uvloop", True),
+]
+
+
+def run_child(args: argparse.Namespace, app: HermesApp):
+    """Measure the latency of one configuration and print it."""
+    latencies = []
+
+    @app.on_topic(TOPIC)
+    def receive(data, payload):
+        latencies.append(time.perf_counter() - float(payload))
+        if len(latencies) == args.messages:
+            app.in_queue.put_nowait(None)
+
+    def publish():
+        # Give the app time to connect and subscribe
+        time.sleep(1.5)
+        client = mqtt.Client()
+        client.connect(app.args.host, app.args.port)
+        client.loop_start()
+        for _ in range(args.messages):
+            client.publish(TOPIC, repr(time.perf_counter()))
+            time.sleep(args.interval)
+
+    threading.Thread(target=publish, daemon=True).start()
+    app.run(loop_policy=args.policy, mqtt_in_loop=args.in_loop)
+
+    # Skip warmup
+    latencies_us = sorted(latency * 1e6 for latency in latencies[args.messages // 10 :])
+    print(
+        f"{statistics.median(latencies_us):.0f} "
+        f"{latencies_us[int(len(latencies_us) * 0.9)]:.0f}"
+    )
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(prog="benchmark_latency")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--interval", type=float, default=0.002)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--policy", default="asyncio", help=argparse.SUPPRESS)
+    parser.add_argument("--in-loop", action="store_true", help=argparse.SUPPRESS)
+
+    if "--child" in sys.argv:
+        app = HermesApp("BenchmarkLatency", parser=parser)
+        run_child(app.args, app)
+        return
+
+    args, hermes_args = parser.parse_known_args()
+    results = {configuration: [] for configuration in CONFIGURATIONS}
+    for round_number in range(args.rounds):
+        for policy, in_loop in CONFIGURATIONS:
+            command = [
+                sys.executable,
+                __file__,
+                "--child",
+                "--policy",
+                policy,
+                "--messages",
+                str(args.messages),
+                "--interval",
+                str(args.interval),
+            ] + hermes_args
+            if in_loop:
+                command.append("--in-loop")
+
+            output = subprocess.run(
+                command, check=True, stdout=subprocess.PIPE, universal_newlines=True
+            ).stdout.split()
+            median, p90 = float(output[-2]), float(output[-1])
+            results[(policy, in_loop)].append((median, p90))
+            print(
+                f"round {round_number + 1}: {policy:8s} mqtt_in_loop={in_loop!s:5s} "
+                f"median={median:.0f}us p90={p90:.0f}us",
+                file=sys.stderr,
+            )
+
+    print("policy   mqtt_in_loop  median of medians (min-max)  median of p90")
+    for (policy, in_loop), runs in results.items():
+        medians = [median for median, _p90 in runs]
+        p90s = [p90 for _median, p90 in runs]
+        print(
+            f"{policy:8s} {in_loop!s:13s} "
+            f"{statistics.median(medians):6.0f}us ({min(medians):.0f}-{max(medians):.0f})"
+            f"{statistics.median(p90s):14.0f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
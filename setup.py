@@ -22,6 +22,7 @@ setuptools.setup(
     packages=setuptools.find_packages(),
     package_data={"rhasspyhermes_app": ["py.typed"]},
     install_requires=requirements,
+    extras_require={"uvloop": ["uvloop"]},
     classifiers=[
         "Programming Language :: Python :: 3",
         "Programming Language :: Python :: 3.7",
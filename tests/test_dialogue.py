@@ -0,0 +1,73 @@
+"""Tests for rhasspyhermes_app dialogue and TTS messages."""
+# pylint: disable=protected-access
+import asyncio
+
+import pytest
+from rhasspyhermes.dialogue import DialogueSessionEnded, DialogueSessionStarted
+from rhasspyhermes.tts import TtsSayFinished
+
+from rhasspyhermes_app import HermesApp
+
+SESSION_STARTED_TOPIC = "hermes/dialogueManager/sessionStarted"
+SESSION_STARTED_PAYLOAD = '{"sessionId": "test_session", "siteId": "default", "customData": null, "lang": null}'
+SESSION_ENDED_TOPIC = "hermes/dialogueManager/sessionEnded"
+SESSION_ENDED_PAYLOAD = '{"termination": {"reason": "nominal"}, "sessionId": "test_session", "siteId": "default", "customData": null}'
+TTS_FINISHED_TOPIC = "hermes/tts/sayFinished"
+TTS_FINISHED_PAYLOAD = '{"siteId": "default", "id": "test_id", "sessionId": null}'
+
+_LOOP = asyncio.get_event_loop()
+
+
+@pytest.mark.asyncio
+async def test_callbacks_session(mocker):
+    """Test session started and ended callbacks."""
+    app = HermesApp("Test session", mqtt_client=mocker.MagicMock())
+
+    started = mocker.MagicMock()
+    ended = mocker.MagicMock()
+    app.on_session_started(started)
+    app.on_session_ended(ended)
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+    assert app.pending_mqtt_topics == {SESSION_STARTED_TOPIC, SESSION_ENDED_TOPIC}
+
+    await app.on_raw_message(SESSION_STARTED_TOPIC, SESSION_STARTED_PAYLOAD)
+    await app.on_raw_message(SESSION_ENDED_TOPIC, SESSION_ENDED_PAYLOAD)
+
+    started.assert_called_once_with(
+        DialogueSessionStarted.from_json(SESSION_STARTED_PAYLOAD)
+    )
+    ended.assert_called_once_with(DialogueSessionEnded.from_json(SESSION_ENDED_PAYLOAD))
+
+
+@pytest.mark.asyncio
+async def test_callbacks_tts_finished_shared(mocker):
+    """Test that all TTS finished callbacks get the same decoded message."""
+    app = HermesApp("Test TTS", mqtt_client=mocker.MagicMock())
+
+    finished1 = mocker.MagicMock()
+    finished2 = mocker.MagicMock()
+    app.on_tts_finished(finished1)
+    app.on_tts_finished(finished2)
+
+    await app.on_raw_message(TTS_FINISHED_TOPIC, TTS_FINISHED_PAYLOAD)
+
+    finished1.assert_called_once_with(TtsSayFinished.from_json(TTS_FINISHED_PAYLOAD))
+    assert finished2.call_args[0][0] is finished1.call_args[0][0]
+
+
+@pytest.mark.asyncio
+async def test_callbacks_session_and_topic(mocker):
+    """Test that raw topic callbacks still get the message of a typed topic."""
+    app = HermesApp("Test session", mqtt_client=mocker.MagicMock())
+
+    started = mocker.MagicMock()
+    raw = mocker.MagicMock()
+    app.on_session_started(started)
+    app.on_topic(SESSION_STARTED_TOPIC)(raw)
+
+    await app.on_raw_message(SESSION_STARTED_TOPIC, SESSION_STARTED_PAYLOAD)
+
+    started.assert_called_once()
+    raw.assert_called_once()
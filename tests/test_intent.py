@@ -0,0 +1,69 @@
+"""Tests for rhasspyhermes_app intent."""
+# pylint: disable=protected-access
+import asyncio
+
+import pytest
+from rhasspyhermes.nlu import NluIntent
+
+from rhasspyhermes_app import HermesApp, SlotIndex
+
+INTENT_TOPIC = "hermes/intent/SetTimer"
+INTENT_PAYLOAD = '{"input": "set a timer for 5 minutes", "intent": {"intentName": "SetTimer", "confidenceScore": 1.0}, "siteId": "default", "sessionId": null, "slots": [{"entity": "number", "value": {"kind": "Number", "value": 5}, "slotName": "minutes", "rawValue": "five", "confidence": 1.0}, {"entity": "label", "value": {"value": "tea"}, "slotName": "label", "rawValue": "tea", "confidence": 1.0}, {"entity": "label", "value": {"value": "eggs"}, "slotName": "label", "rawValue": "eggs", "confidence": 1.0}]}'
+
+_LOOP = asyncio.get_event_loop()
+
+
+@pytest.mark.asyncio
+async def test_callbacks_intent(mocker):
+    """Test intent callbacks."""
+    app = HermesApp("Test NluIntent", mqtt_client=mocker.MagicMock())
+
+    # Mock intent callback and apply on_intent decorator.
+    set_timer = mocker.MagicMock(return_value=None)
+    app.on_intent("SetTimer")(set_timer)
+
+    # Simulate app.run() without the MQTT client.
+    app._subscribe_callbacks()
+
+    # Simulate received intent.
+    await app.on_raw_message(INTENT_TOPIC, INTENT_PAYLOAD)
+
+    # Check whether callback has been called with the right Rhasspy Hermes object.
+    set_timer.assert_called_once_with(NluIntent.from_json(INTENT_PAYLOAD))
+
+
+@pytest.mark.asyncio
+async def test_callbacks_intent_slot_index(mocker):
+    """Test intent callbacks with a shared slot index."""
+    app = HermesApp("Test NluIntent", mqtt_client=mocker.MagicMock())
+
+    set_timer1 = mocker.MagicMock(return_value=None)
+    set_timer2 = mocker.MagicMock(return_value=None)
+    app.on_intent("SetTimer", slot_index=True)(set_timer1)
+    app.on_intent("SetTimer", slot_index=True)(set_timer2)
+
+    await app.on_raw_message(INTENT_TOPIC, INTENT_PAYLOAD)
+
+    intent, slots = set_timer1.call_args[0]
+    assert intent == NluIntent.from_json(INTENT_PAYLOAD)
+    assert isinstance(slots, SlotIndex)
+
+    # Both callbacks share the same slot index.
+    assert set_timer2.call_args[0][1] is slots
+
+
+def test_slot_index():
+    """Test slot index accessors."""
+    slots = SlotIndex(NluIntent.from_json(INTENT_PAYLOAD).slots)
+
+    assert len(slots) == 2
+    assert set(slots) == {"minutes", "label"}
+    assert slots["minutes"].raw_value == "five"
+    assert slots.entity("minutes") == "number"
+    assert slots.value("minutes") == 5
+    assert slots.raw_value("label") == "tea"
+    assert [slot.raw_value for slot in slots.all("label")] == ["tea", "eggs"]
+
+    assert slots.value("missing", 10) == 10
+    assert slots.entity("missing") is None
+    assert not slots.all("missing")
@@ -0,0 +1,114 @@
+"""Tests for rhasspyhermes_app dispatcher logging."""
+# pylint: disable=protected-access
+import asyncio
+import logging
+
+import pytest
+
+from rhasspyhermes_app import HermesApp, LogLimits
+
+HOTWORD_TOPIC = "hermes/hotword/test/detected"
+AUDIO_TOPIC = "hermes/audioServer/default/playBytes/test"
+
+_LOOP = asyncio.get_event_loop()
+
+
+@pytest.mark.asyncio
+async def test_unexpected_topic_rate_limit(mocker, caplog):
+    """Test that warnings about unexpected topics are rate-limited."""
+    app = HermesApp(
+        "Test logging",
+        mqtt_client=mocker.MagicMock(),
+        log_limits=LogLimits(burst=2, sample=3),
+    )
+
+    with caplog.at_level(logging.WARNING, logger="HermesApp"):
+        for _ in range(8):
+            await app.on_raw_message(AUDIO_TOPIC, b"\x00" * 1024)
+
+    # Two messages in the burst, then one in three.
+    records = [record for record in caplog.records if record.name == "HermesApp"]
+    assert len(records) == 4
+    assert records[0].getMessage() == f"Unexpected topic: {AUDIO_TOPIC}"
+    assert records[0].topic == AUDIO_TOPIC
+
+
+@pytest.mark.asyncio
+async def test_dropped_messages(mocker, caplog):
+    """Test that the number of dropped messages is logged in the next interval."""
+    app = HermesApp(
+        "Test logging",
+        mqtt_client=mocker.MagicMock(),
+        log_limits=LogLimits(burst=1, sample=0, interval=0.05),
+    )
+
+    with caplog.at_level(logging.WARNING, logger="HermesApp"):
+        for _ in range(3):
+            await app.on_raw_message(AUDIO_TOPIC, b"")
+        await asyncio.sleep(0.1)
+        await app.on_raw_message(AUDIO_TOPIC, b"")
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert messages == [
+        f"Unexpected topic: {AUDIO_TOPIC}",
+        f"Dropped 2 message(s) like 'Unexpected topic: %s', last topic: {AUDIO_TOPIC}",
+        f"Unexpected topic: {AUDIO_TOPIC}",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_varying_topics(mocker, caplog):
+    """Test that messages on unique topics share one rate limit."""
+    app = HermesApp(
+        "Test logging",
+        mqtt_client=mocker.MagicMock(),
+        log_limits=LogLimits(burst=10, sample=0, interval=0.05),
+    )
+
+    with caplog.at_level(logging.WARNING, logger="HermesApp"):
+        for request_id in range(5000):
+            await app.on_raw_message(f"{AUDIO_TOPIC}/{request_id}", b"\x00" * 256)
+
+        assert len(caplog.records) == 10
+
+        # The dropped messages are reported when the interval expires.
+        await asyncio.sleep(0.1)
+
+    assert len(caplog.records) == 11
+    assert caplog.records[-1].getMessage() == (
+        "Dropped 4990 message(s) like 'Unexpected topic: %s', "
+        f"last topic: {AUDIO_TOPIC}/4999"
+    )
+
+
+@pytest.mark.asyncio
+async def test_payload_truncated(mocker, caplog):
+    """Test that payloads are truncated in error messages."""
+    app = HermesApp(
+        "Test logging",
+        mqtt_client=mocker.MagicMock(),
+        log_limits=LogLimits(max_payload=8),
+    )
+    app.on_hotword(mocker.MagicMock())
+
+    payload = b'{"siteId": "default", "modelType": "personal"}'
+    with caplog.at_level(logging.ERROR, logger="HermesApp"):
+        await app.on_raw_message(HOTWORD_TOPIC, payload)
+
+    assert len(caplog.records) == 1
+    record = caplog.records[0]
+    message = record.getMessage()
+    assert message.startswith("Missing key")
+    assert message.endswith(f"b'{{\"siteId'... ({len(payload)} bytes)")
+    assert record.payload_size == len(payload)
+
+
+@pytest.mark.asyncio
+async def test_disabled_level(mocker):
+    """Test that nothing is counted when the log level is disabled."""
+    app = HermesApp("Test logging", mqtt_client=mocker.MagicMock())
+    mocker.patch.object(app._dispatch_logger.logger, "isEnabledFor", return_value=False)
+
+    await app.on_raw_message(AUDIO_TOPIC, b"")
+
+    assert not app._dispatch_logger._counters
@@ -0,0 +1,115 @@
+"""Tests for rhasspyhermes_app message priority lanes."""
+# pylint: disable=protected-access
+import asyncio
+
+import pytest
+from paho.mqtt.client import MQTTMessage
+from rhasspyhermes.nlu import NluIntent, NluIntentNotRecognized
+from rhasspyhermes.tts import TtsSayFinished
+from rhasspyhermes.wake import HotwordDetected
+
+from rhasspyhermes_app import HermesApp, _MessageLaneQueue, _priority_message_type
+
+HOTWORD_TOPIC = "hermes/hotword/test/detected"
+HOTWORD_PAYLOAD = b'{"modelId": "test_model.ppn", "modelVersion": "", "modelType": "personal", "currentSensitivity": 0.5, "siteId": "test_site"}'
+AUDIO_TOPIC = "hermes/audioServer/default/playBytes/test"
+
+_LOOP = asyncio.get_event_loop()
+
+
+def _message(topic, payload=b""):
+    message = MQTTMessage(topic=topic.encode())
+    message.payload = payload
+    return message
+
+
+@pytest.mark.parametrize(
+    "topic",
+    [
+        HOTWORD_TOPIC,
+        "hermes/hotword/a/b/detected",
+        "hermes/hotword/detected",
+        "hermes/hotword//detected",
+        "hermes/hotword/toggleOn",
+        "hermes/intent/GetTime",
+        "hermes/intent/",
+        "hermes/nlu/intentNotRecognized",
+        AUDIO_TOPIC,
+    ],
+)
+def test_priority_message_type(topic):
+    """Test that the prefix check agrees with the topic patterns of the messages."""
+    expected = None
+    for message_type in (HotwordDetected, NluIntent, NluIntentNotRecognized):
+        if message_type.is_topic(topic):
+            expected = message_type
+
+    assert _priority_message_type(topic) is expected
+
+
+@pytest.mark.asyncio
+async def test_priority_lane():
+    """Test that hotword messages overtake raw topic messages."""
+    queue = _MessageLaneQueue()
+    queue.put_nowait(_message(AUDIO_TOPIC))
+    queue.put_nowait(_message(HOTWORD_TOPIC))
+
+    assert queue.qsize() == 2
+    assert (await queue.get()).topic == HOTWORD_TOPIC
+    assert (await queue.get()).topic == AUDIO_TOPIC
+    assert queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_starvation_limit():
+    """Test that raw topic messages are dispatched after the starvation limit."""
+    queue = _MessageLaneQueue(starvation_limit=2)
+    queue.put_nowait(_message(AUDIO_TOPIC))
+    for _ in range(3):
+        queue.put_nowait(_message(HOTWORD_TOPIC))
+
+    topics = [(await queue.get()).topic for _ in range(4)]
+    assert topics == [HOTWORD_TOPIC, HOTWORD_TOPIC, AUDIO_TOPIC, HOTWORD_TOPIC]
+
+
+@pytest.mark.asyncio
+async def test_handle_messages_priority(mocker):
+    """Test that the app dispatches a queued hotword before queued raw topics."""
+    app = HermesApp("Test priority", mqtt_client=mocker.MagicMock())
+
+    calls = []
+    app.on_hotword(lambda hotword: calls.append(HOTWORD_TOPIC))
+    app.on_topic(AUDIO_TOPIC)(lambda data, payload: calls.append(data.topic))
+
+    # Simulate messages received before the main loop started.
+    app.pre_queue.put(_message(AUDIO_TOPIC))
+    app.pre_queue.put(_message(AUDIO_TOPIC))
+    app.pre_queue.put(_message(HOTWORD_TOPIC, HOTWORD_PAYLOAD))
+    app.pre_queue.put(None)
+
+    await app.handle_messages_async()
+
+    assert calls == [HOTWORD_TOPIC, AUDIO_TOPIC, AUDIO_TOPIC]
+
+
+@pytest.mark.asyncio
+async def test_handle_messages_subscribed_types(mocker):
+    """Test that messages of subscribed types still reach on_message."""
+    app = HermesApp("Test priority", mqtt_client=mocker.MagicMock())
+    app.subscribe(TtsSayFinished)
+
+    messages = []
+
+    async def on_message(message, site_id=None, session_id=None, topic=None):
+        messages.append(message)
+        yield None
+
+    app.on_message = on_message
+
+    app.pre_queue.put(_message("hermes/tts/sayFinished", b'{"siteId": "default"}'))
+    app.pre_queue.put(None)
+
+    await app.handle_messages_async()
+    await asyncio.sleep(0)
+
+    assert messages == [TtsSayFinished(site_id="default")]
@@ -0,0 +1,233 @@
+"""Tests for rhasspyhermes_app module reloading."""
+# pylint: disable=protected-access, redefined-outer-name
+import asyncio
+import os
+import sys
+import threading
+import types
+
+import pytest
+from rhasspyhermes.tts import TtsSayFinished
+
+from rhasspyhermes_app import HermesApp
+
+HOTWORD_TOPIC = "hermes/hotword/test/detected"
+HOTWORD_PAYLOAD = '{"modelId": "test_model.ppn", "modelVersion": "", "modelType": "personal", "currentSensitivity": 0.5, "siteId": "test_site"}'
+
+SKILL_V1 = """
+from skill_host import app, calls
+
+@app.on_intent("GetTime")
+def get_time(intent):
+    calls.append("v1")
+
+@app.on_topic("hermes/tts/{site_id}/say")
+def say(data, payload):
+    calls.append(data.data["site_id"])
+"""
+
+SKILL_V2 = """
+from skill_host import app, calls
+
+@app.on_intent("GetDate")
+def get_date(intent):
+    calls.append("v2")
+
+@app.on_hotword
+def wake(hotword):
+    calls.append(hotword.model_id)
+"""
+
+SKILL_THREAD = """
+import threading
+
+from skill_host import app, calls
+
+calls.append(threading.get_ident())
+"""
+
+SKILL_TTS = """
+from skill_host import app, calls
+
+@app.on_tts_finished
+def tts_finished(say_finished):
+    calls.append(say_finished.id)
+"""
+
+_LOOP = asyncio.get_event_loop()
+
+
+@pytest.fixture
+def skill(mocker, monkeypatch, tmp_path):
+    """Create an app with a skill module that can be rewritten."""
+    app = HermesApp("Test reload", mqtt_client=mocker.MagicMock())
+    app.is_connected = True
+
+    calls: list = []
+    host = types.ModuleType("skill_host")
+    setattr(host, "app", app)
+    setattr(host, "calls", calls)
+    monkeypatch.setitem(sys.modules, "skill_host", host)
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    skill_path = tmp_path / "reload_skill.py"
+    skill_path.write_text(SKILL_V1)
+
+    yield app, calls, skill_path
+
+    sys.modules.pop("reload_skill", None)
+
+
+@pytest.mark.asyncio
+async def test_reload(skill):
+    """Test swapping the callbacks of a reloaded module."""
+    app, calls, skill_path = skill
+
+    @app.on_intent("GetTime")
+    def other_get_time(intent):
+        calls.append("other")
+
+    assert app.reload("reload_skill")
+    app._subscribe_callbacks()
+    assert len(app._callbacks_intent["GetTime"]) == 2
+    assert len(app._callbacks_topic_regex) == 1
+    assert "hermes/tts/+/say" in app.subscribed_topics
+
+    await app.on_raw_message("hermes/tts/kitchen/say", b"{}")
+    assert calls == ["kitchen"]
+
+    skill_path.write_text(SKILL_V2)
+    assert app.reload("reload_skill")
+
+    # Callbacks from other modules are kept.
+    assert app._callbacks_intent["GetTime"] == [other_get_time]
+    assert len(app._callbacks_intent["GetDate"]) == 1
+    assert len(app._callbacks_hotword) == 1
+    assert not app._callbacks_topic_regex
+    assert not app._additional_topic
+
+    # Subscriptions are updated incrementally.
+    app.mqtt_client.unsubscribe.assert_called_once_with("hermes/tts/+/say")
+    app.mqtt_client.subscribe.assert_any_call("hermes/intent/GetDate")
+    app.mqtt_client.subscribe.assert_any_call("hermes/hotword/+/detected")
+    assert "hermes/intent/GetTime" in app.subscribed_topics
+
+    await app.on_raw_message(HOTWORD_TOPIC, HOTWORD_PAYLOAD)
+    assert calls == ["kitchen", "test_model.ppn"]
+
+
+def test_reload_error(skill):
+    """Test that the previous callbacks stay active if the module can't be imported."""
+    app, _calls, skill_path = skill
+
+    assert app.reload("reload_skill")
+    callbacks_intent = app._callbacks_intent
+
+    skill_path.write_text(SKILL_V1 + "\nsyntax error")
+    assert not app.reload("reload_skill")
+
+    assert app._callbacks_intent is callbacks_intent
+    assert len(app._callbacks_intent["GetTime"]) == 1
+    app.mqtt_client.unsubscribe.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_reload_from_thread(skill):
+    """Test that reloading from another thread re-imports the module in the loop."""
+    app, calls, skill_path = skill
+    skill_path.write_text(SKILL_THREAD)
+    loop = asyncio.get_running_loop()
+    app.loop = loop
+
+    assert await loop.run_in_executor(None, app.reload, "reload_skill")
+    assert calls == [threading.get_ident()]
+
+
+def test_reload_subscribed_types(skill):
+    """Test that topics of subscribed message types stay subscribed."""
+    app, _calls, skill_path = skill
+    app.subscribe(TtsSayFinished)
+    skill_path.write_text(SKILL_TTS)
+    assert app.reload("reload_skill")
+
+    skill_path.write_text(SKILL_V1)
+    assert app.reload("reload_skill")
+
+    assert not app._callbacks_message
+    app.mqtt_client.unsubscribe.assert_not_called()
+    assert TtsSayFinished.topic() in app.subscribed_topics
+
+
+def _touch(path, content):
+    """Rewrite a file and make sure its modification time changes."""
+    mtime = os.stat(path).st_mtime
+    path.write_text(content)
+    os.utime(path, (mtime + 1, mtime + 1))
+
+
+@pytest.mark.asyncio
+async def test_watch(skill):
+    """Test that a watched module is reloaded when its file changes."""
+    app, _calls, skill_path = skill
+    app.reload("reload_skill")
+    app.watch("reload_skill", interval=0.01)
+
+    task = asyncio.ensure_future(app.handle_messages_async())
+    _touch(skill_path, SKILL_V2)
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if "GetDate" in app._callbacks_intent:
+            break
+
+    assert "GetDate" in app._callbacks_intent
+    assert "GetTime" not in app._callbacks_intent
+
+    # Watching stops with the main loop.
+    app.in_queue.put_nowait(None)
+    await task
+    assert app._watch_task is None
+
+
+@pytest.mark.asyncio
+async def test_watch_after_start(skill):
+    """Test calling watch() while the main loop runs."""
+    app, _calls, skill_path = skill
+    app.reload("reload_skill")
+
+    task = asyncio.ensure_future(app.handle_messages_async())
+    await asyncio.sleep(0)
+    assert app._watch_task is None
+
+    app.watch("reload_skill", interval=0.01)
+    await asyncio.sleep(0)
+    assert app._watch_task is not None
+
+    _touch(skill_path, SKILL_V2)
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if "GetDate" in app._callbacks_intent:
+            break
+
+    assert "GetDate" in app._callbacks_intent
+
+    app.in_queue.put_nowait(None)
+    await task
+
+
+@pytest.mark.asyncio
+async def test_watch_error(skill, mocker):
+    """Test that the watcher keeps running when reloading raises an exception."""
+    app, _calls, skill_path = skill
+    app.reload("reload_skill")
+    mocker.patch.object(app, "subscribe_topics", side_effect=RuntimeError)
+    app.watch("reload_skill", interval=0.01)
+
+    task = asyncio.ensure_future(app.handle_messages_async())
+    _touch(skill_path, SKILL_V2)
+    await asyncio.sleep(0.05)
+
+    assert not app._watch_task.done()
+
+    app.in_queue.put_nowait(None)
+    await task
@@ -0,0 +1,227 @@
+"""Tests for rhasspyhermes_app event loop selection."""
+# pylint: disable=protected-access
+import asyncio
+import struct
+
+import paho.mqtt.client as mqtt
+import pytest
+from paho.mqtt.client import MQTTMessage
+
+from rhasspyhermes_app import (
+    HermesApp,
+    _MessageLaneQueue,
+    _MqttLoopAdapter,
+    _set_event_loop_policy,
+)
+
+_LOOP = asyncio.get_event_loop()
+
+
+class FakeBroker:
+    """Minimal MQTT broker that accepts one client and publishes messages to it."""
+
+    def __init__(self):
+        self.server = None
+        self.port = 0
+        self.writer = None
+        self.subscribed = asyncio.Event()
+
+    async def start(self):
+        """Start listening, on the same port as before if the broker is restarted."""
+        self.subscribed.clear()
+        self.server = await asyncio.start_server(
+            self.handle_client, "127.0.0.1", self.port
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stop listening and close the connection with the client."""
+        self.server.close()
+        await self.server.wait_closed()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def publish(self, topic: str, payload: bytes):
+        """Publish a message with QoS 0 to the client."""
+        body = struct.pack("!H", len(topic)) + topic.encode() + payload
+        self.writer.write(bytes([0x30, len(body)]) + body)
+
+    async def handle_client(self, reader, writer):
+        """Handle the packets of a client."""
+        self.writer = writer
+        try:
+            while True:
+                header = await reader.readexactly(1)
+                length, shift = 0, 0
+                while True:
+                    byte = (await reader.readexactly(1))[0]
+                    length += (byte & 0x7F) << shift
+                    shift += 7
+                    if byte < 0x80:
+                        break
+
+                body = await reader.readexactly(length)
+                packet_type = header[0] >> 4
+                if packet_type == 1:
+                    # CONNECT -> CONNACK
+                    writer.write(b"\x20\x02\x00\x00")
+                elif packet_type == 8:
+                    # SUBSCRIBE -> SUBACK with QoS 0
+                    writer.write(b"\x90\x03" + body[:2] + b"\x00")
+                    self.subscribed.set()
+                elif packet_type == 12:
+                    # PINGREQ -> PINGRESP
+                    writer.write(b"\xd0\x00")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+
+@pytest.fixture
+def restore_policy():
+    """Restore the event loop policy after a test."""
+    policy = asyncio.get_event_loop_policy()
+    yield
+    asyncio.set_event_loop_policy(policy)
+
+
+@pytest.mark.usefixtures("restore_policy")
+def test_event_loop_policy():
+    """Test selecting the event loop policy."""
+    policy = asyncio.DefaultEventLoopPolicy()
+    _set_event_loop_policy(policy)
+    assert asyncio.get_event_loop_policy() is policy
+
+    _set_event_loop_policy("asyncio")
+    assert isinstance(asyncio.get_event_loop_policy(), asyncio.DefaultEventLoopPolicy)
+
+    with pytest.raises(ValueError):
+        _set_event_loop_policy("foobar")
+
+
+@pytest.mark.usefixtures("restore_policy")
+def test_event_loop_policy_auto():
+    """Test that "auto" uses uvloop only if it's installed."""
+    try:
+        import uvloop  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        uvloop = None
+
+    policy = asyncio.get_event_loop_policy()
+    _set_event_loop_policy("auto")
+
+    if uvloop is None:
+        assert asyncio.get_event_loop_policy() is policy
+    else:
+        assert isinstance(asyncio.get_event_loop_policy(), uvloop.EventLoopPolicy)
+
+
+@pytest.mark.asyncio
+async def test_mqtt_on_message_in_loop(mocker):
+    """Test that received messages are queued directly when MQTT runs in the loop."""
+    app = HermesApp("Test mqtt_in_loop", mqtt_client=mocker.MagicMock())
+    app.loop = mocker.MagicMock()
+    app.in_queue = _MessageLaneQueue()
+    app._mqtt_in_loop = True
+
+    message = MQTTMessage(topic=b"hermes/tts/say")
+    app.mqtt_on_message(None, None, message)
+
+    app.loop.call_soon_threadsafe.assert_not_called()
+    assert app.in_queue.get_nowait() is message
+
+
+@pytest.mark.asyncio
+async def test_mqtt_in_loop_reconnect(mocker):
+    """Test that the app receives messages again after the broker restarts."""
+    mocker.patch.object(_MqttLoopAdapter, "reconnect_delay_min", 0.01)
+
+    broker = FakeBroker()
+    await broker.start()
+
+    app = HermesApp("Test mqtt_in_loop")
+    app.args.host = "127.0.0.1"
+    app.args.port = broker.port
+
+    received = []
+    app.on_topic("test/topic")(lambda data, payload: received.append(payload))
+    app._subscribe_callbacks()
+
+    task = asyncio.ensure_future(app._handle_messages_mqtt_in_loop_async())
+    await asyncio.wait_for(broker.subscribed.wait(), 5)
+    broker.publish("test/topic", b"before")
+
+    # Restart the broker.
+    await broker.stop()
+    await asyncio.sleep(0.05)
+    assert not app.is_connected
+    await broker.start()
+
+    await asyncio.wait_for(broker.subscribed.wait(), 5)
+    broker.publish("test/topic", b"after")
+
+    for _ in range(100):
+        await asyncio.sleep(0.01)
+        if len(received) == 2:
+            break
+
+    assert received == [b"before", b"after"]
+    assert app.is_connected
+
+    app.in_queue.put_nowait(None)
+    await task
+    app.mqtt_client.disconnect()
+    await broker.stop()
+
+
+@pytest.mark.asyncio
+async def test_mqtt_in_loop_disconnect(mocker):
+    """Test that the app doesn't reconnect after disconnecting on purpose."""
+    mocker.patch.object(_MqttLoopAdapter, "reconnect_delay_min", 0.01)
+
+    broker = FakeBroker()
+    await broker.start()
+
+    app = HermesApp("Test mqtt_in_loop")
+    app.args.host = "127.0.0.1"
+    app.args.port = broker.port
+    app.on_topic("test/topic")(lambda data, payload: None)
+    app._subscribe_callbacks()
+
+    task = asyncio.ensure_future(app._handle_messages_mqtt_in_loop_async())
+    await asyncio.wait_for(broker.subscribed.wait(), 5)
+
+    broker.subscribed.clear()
+    app.mqtt_client.disconnect()
+    await asyncio.sleep(0.1)
+
+    assert not broker.subscribed.is_set()
+    assert app.mqtt_client.socket() is None
+    assert not app.is_connected
+
+    app.in_queue.put_nowait(None)
+    await task
+    await broker.stop()
+
+
+def test_mqtt_loop_adapter_read_pending(mocker):
+    """Test that data buffered by TLS is read without waiting for the socket."""
+    client = mocker.MagicMock()
+    client.loop_read.return_value = mqtt.MQTT_ERR_SUCCESS
+    client.socket.return_value.pending.side_effect = [2, 1, 0]
+    adapter = _MqttLoopAdapter(mocker.MagicMock(), client)
+
+    adapter.read()
+
+    assert client.loop_read.call_count == 3
+
+
+def test_mqtt_loop_adapter_closed_loop(mocker):
+    """Test that closing the socket doesn't reconnect once the loop is closed."""
+    loop = mocker.MagicMock()
+    loop.is_closed.return_value = True
+    adapter = _MqttLoopAdapter(loop, mocker.MagicMock())
+
+    adapter.on_socket_close(adapter.client, None, mocker.MagicMock())
+
+    loop.create_task.assert_not_called()
@@ -0,0 +1,121 @@
+"""Tests for rhasspyhermes_app raw topics."""
+# pylint: disable=protected-access
+import asyncio
+import json
+
+import pytest
+
+from rhasspyhermes_app import HermesApp, TopicData
+
+SAY_TOPIC = "hermes/tts/kitchen/say"
+SAY_PAYLOAD = b'{"text": "Hello", "siteId": "kitchen"}'
+
+_LOOP = asyncio.get_event_loop()
+
+
+@pytest.mark.asyncio
+async def test_callbacks_topic_template(mocker):
+    """Test topic callbacks with a template."""
+    app = HermesApp("Test topic", mqtt_client=mocker.MagicMock())
+
+    say = mocker.MagicMock()
+    app.on_topic("hermes/tts/{site_id}/say")(say)
+
+    app._subscribe_callbacks()
+    assert app.pending_mqtt_topics == {"hermes/tts/+/say"}
+
+    await app.on_raw_message(SAY_TOPIC, SAY_PAYLOAD)
+
+    say.assert_called_once_with(
+        TopicData(SAY_TOPIC, {"site_id": "kitchen"}), SAY_PAYLOAD
+    )
+
+
+@pytest.mark.asyncio
+async def test_callbacks_topic_decode_shared(mocker):
+    """Test that the payload is decoded once and shared by all callbacks."""
+    app = HermesApp("Test topic", mqtt_client=mocker.MagicMock())
+    loads = mocker.MagicMock(wraps=json.loads)
+
+    say1 = mocker.MagicMock()
+    say2 = mocker.MagicMock()
+    raw = mocker.MagicMock()
+    app.on_topic("hermes/tts/{site_id}/say", decode=loads)(say1)
+    app.on_topic("hermes/tts/{site_id}/say", decode=loads)(say2)
+    app.on_topic("hermes/tts/+/say")(raw)
+
+    await app.on_raw_message(SAY_TOPIC, SAY_PAYLOAD)
+
+    data, payload = say1.call_args[0]
+    assert data == TopicData(SAY_TOPIC, {"site_id": "kitchen"})
+    assert payload == {"text": "Hello", "siteId": "kitchen"}
+
+    # The decoded payload is shared, each callback gets its own topic data.
+    assert say2.call_args[0][1] is payload
+    assert say2.call_args[0][0] == data
+    assert say2.call_args[0][0] is not data
+    loads.assert_called_once()
+
+    raw.assert_called_once_with(TopicData(SAY_TOPIC, {}), SAY_PAYLOAD)
+
+
+@pytest.mark.asyncio
+async def test_callbacks_topic_decode_json_read_only(mocker):
+    """Test that a JSON payload shared by callbacks can't be modified."""
+    app = HermesApp("Test topic", mqtt_client=mocker.MagicMock())
+
+    say = mocker.MagicMock()
+    app.on_topic(SAY_TOPIC, decode="json")(say)
+
+    await app.on_raw_message(SAY_TOPIC, b'{"text": "Hello", "slots": [{"a": 1}]}')
+
+    payload = say.call_args[0][1]
+    assert payload["text"] == "Hello"
+    assert payload["slots"][0]["a"] == 1
+
+    with pytest.raises(TypeError):
+        payload["text"] = "Goodbye"
+    with pytest.raises(TypeError):
+        payload["slots"][0]["a"] = 2
+    with pytest.raises(AttributeError):
+        payload["slots"].append({})
+
+
+@pytest.mark.asyncio
+async def test_callbacks_topic_decode_text_and_codec(mocker):
+    """Test text and custom decoding of payloads."""
+    app = HermesApp("Test topic", mqtt_client=mocker.MagicMock())
+
+    text = mocker.MagicMock()
+    length = mocker.MagicMock()
+    app.on_topic(SAY_TOPIC, decode="text")(text)
+    app.on_topic(SAY_TOPIC, decode=len)(length)
+
+    await app.on_raw_message(SAY_TOPIC, SAY_PAYLOAD)
+
+    text.assert_called_once_with(TopicData(SAY_TOPIC, {}), SAY_PAYLOAD.decode("utf-8"))
+    length.assert_called_once_with(TopicData(SAY_TOPIC, {}), len(SAY_PAYLOAD))
+
+
+@pytest.mark.asyncio
+async def test_callbacks_topic_decode_error(mocker):
+    """Test that callbacks aren't called when the payload can't be decoded."""
+    app = HermesApp("Test topic", mqtt_client=mocker.MagicMock())
+
+    decoded = mocker.MagicMock()
+    raw = mocker.MagicMock()
+    app.on_topic(SAY_TOPIC, decode="json")(decoded)
+    app.on_topic(SAY_TOPIC)(raw)
+
+    await app.on_raw_message(SAY_TOPIC, b"not json")
+
+    decoded.assert_not_called()
+    raw.assert_called_once()
+
+
+def test_unknown_decode_mode(mocker):
+    """Test that an unknown decode mode is rejected."""
+    app = HermesApp("Test topic", mqtt_client=mocker.MagicMock())
+
+    with pytest.raises(ValueError):
+        app.on_topic(SAY_TOPIC, decode="yaml")